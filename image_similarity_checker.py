@@ -4,9 +4,13 @@ import time
 import cv2
 import numpy as np
 import platform
+import hashlib
 from datetime import timedelta
-from skimage.metrics import structural_similarity as ssim
 from math import comb
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import multiprocessing
+from multiprocessing import shared_memory
 import ctypes
 
 
@@ -15,9 +19,102 @@ try:
 except ImportError:
     tqdm = None
 
+try:
+    from numba import njit, prange, set_num_threads
+except ImportError:
+    njit = None
+
+try:
+    from PIL import Image
+    from importlib import metadata
+    try:
+        # Флага SIMD в PIL.features нет: Pillow-SIMD определяется по установленному
+        # дистрибутиву, версия которого совпадает с загруженным модулем PIL
+        pillow_simd = metadata.version("Pillow-SIMD") == Image.__version__
+    except metadata.PackageNotFoundError:
+        pillow_simd = False
+except ImportError:
+    pillow_simd = False
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_GRAY
+    turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    turbo_jpeg = None
+
+
+# Стандартная сетка SSIM (ширина, высота), к которой приводятся изображения
+IMAGE_SIZE = (256, 256)
+
+# Файлы больше этого размера декодируются сразу в половинном разрешении
+REDUCED_DECODE_BYTES = 1 << 20
+
+# Кэш подготовленных изображений авто-скана; версия меняется при изменении
+# предобработки. Файлы кэша, не использовавшиеся CACHE_MAX_AGE секунд, удаляются
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "image_similarity_checker")
+CACHE_VERSION = 5
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+# Параметры SSIM (Wang et al.): гауссово окно 11x11, sigma=1.5, 8-битный диапазон
+SSIM_WINDOW = (11, 11)
+SSIM_SIGMA = 1.5
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+# img — изображение за вычетом своего округлённого среднего, mu — локальное
+# среднее, mu_c — локальное среднее центрированного img (mu минус то же среднее)
+ImageStats = namedtuple("ImageStats", ["img", "mu", "mu_c", "sigma_sq"])
+
+# Статистики авто-скана в общей памяти процессов. Пиксели 8-битные и хранятся
+# в uint8 без потерь; средние и дисперсии — во float32, как в вычислениях:
+# их округление до float16 заметно сдвигает SSIM. img и mu_c восстанавливаются
+# центрированием при чтении (см. _shared_image_stats)
+SharedStats = namedtuple("SharedStats", ["img", "mu", "sigma_sq"])
+SHARED_DTYPES = SharedStats(np.uint8, np.float32, np.float32)
+
+# Префильтр pHash авто-скана. Пара с расстоянием Хэмминга больше
+# PHASH_MAX_DISTANCE пропускается без SSIM, только если порог не ниже
+# PHASH_MIN_SIMILARITY (поиск почти-дубликатов): при меньших порогах похожие
+# по SSIM пары встречаются и на больших расстояниях. Изображения с СКО яркости
+# ниже PHASH_MIN_CONTRAST не отсеиваются никогда: биты их pHash — шум, а SSIM
+# почти однородных изображений высок при любом расстоянии
+PHASH_MAX_DISTANCE = 12
+PHASH_MIN_SIMILARITY = 95
+PHASH_MIN_CONTRAST = 8.0
+PhashFilter = namedtuple("PhashFilter", ["hashes", "textured", "max_distance"])
+
+# Сколько изображений строки авто-скана сравнивается одной пакетной операцией
+ROW_BATCH = 8
+
+# Минимальный интервал между обновлениями заголовка окна, секунды
+TITLE_INTERVAL = 0.1
+_last_title_time = 0.0
+
+# Буфер текстового прогресс-бара, изменяемый на месте
+_PROGRESS_BAR = bytearray(b"-" * 40)
+_BAR_FILLED = memoryview(b"#" * len(_PROGRESS_BAR))
+_BAR_EMPTY = memoryview(b"-" * len(_PROGRESS_BAR))
+_progress_filled = 0
+
+# Размер пакета пар для одного вызова SSIM на GPU
+GPU_BATCH = 256
+
+# JAX подключается лениво, только для авто-скана с ключом --gpu (см. load_gpu_backend)
+GpuBackend = namedtuple("GpuBackend", ["jnp", "ssim_batch"])
+_gpu_backend = None
+
+# Состояние процесса-воркера авто-скана (см. _init_scan_worker)
+_scan_state = {}
+
+
+def set_window_title(title, force=False):
+    """Изменяет заголовок окна консоли (не чаще TITLE_INTERVAL секунд)"""
+    global _last_title_time
+    now = time.monotonic()
+    if not force and now - _last_title_time < TITLE_INTERVAL:
+        return
+    _last_title_time = now
 
-def set_window_title(title):
-    """Изменяет заголовок окна консоли"""
     if platform.system() == 'Windows':
         ctypes.windll.kernel32.SetConsoleTitleW(title)
     elif platform.system() == 'Linux':
@@ -27,50 +124,182 @@ def set_window_title(title):
 
 
 def print_progress(current, total, prefix=""):
-    """Текстовый прогресс-бар"""
-    bar_length = 40
+    """Текстовый прогресс-бар (байтовый буфер, меняются только новые деления)"""
+    global _progress_filled
     progress = current / total
-    filled = int(bar_length * progress)
-    bar = '█' * filled + '-' * (bar_length - filled)
-    percent = progress * 100
-    sys.stdout.write(f"\r{prefix} |{bar}| {percent:.1f}% ({current}/{total})")
+    filled = int(len(_PROGRESS_BAR) * progress)
+    if filled > _progress_filled:
+        _PROGRESS_BAR[_progress_filled:filled] = _BAR_FILLED[_progress_filled:filled]
+    elif filled < _progress_filled:
+        _PROGRESS_BAR[filled:_progress_filled] = _BAR_EMPTY[filled:_progress_filled]
+    _progress_filled = filled
+
+    stream = getattr(sys.stdout, "buffer", None)
+    if stream is None:
+        sys.stdout.write(f"\r{prefix} |{_PROGRESS_BAR.decode()}| "
+                         f"{progress * 100:.1f}% ({current}/{total})")
+    else:
+        stream.write(b"\r%s |%s| %.1f%% (%d/%d)" % (
+            prefix.encode(sys.stdout.encoding or "utf-8", "replace"),
+            _PROGRESS_BAR, progress * 100, current, total))
     sys.stdout.flush()
 
 
-def load_image(image_path, verbose=True):
-    """Загружает изображение с ограниченным выводом истории"""
+def load_image(image_path, size_bytes=None):
+    """Загружает изображение сразу в оттенках серого.
+
+    size_bytes — уже известный размер файла (например, из os.scandir).
+    """
     absolute_path = os.path.abspath(image_path)
     try:
+        if size_bytes is None:
+            size_bytes = os.path.getsize(absolute_path)
+        # Крупные файлы декодируются сразу в половинном разрешении
+        reduced = size_bytes > REDUCED_DECODE_BYTES
+
+        if turbo_jpeg and absolute_path.lower().endswith(('.jpg', '.jpeg')):
+            with open(absolute_path, 'rb') as f:
+                data = f.read()
+            # libjpeg-turbo сразу отдаёт оттенки серого
+            image = turbo_jpeg.decode(data, pixel_format=TJPF_GRAY,
+                                      scaling_factor=(1, 2) if reduced else None)
+            return image[:, :, 0]
+
+        flags = cv2.IMREAD_REDUCED_GRAYSCALE_2 if reduced else cv2.IMREAD_GRAYSCALE
+        if absolute_path.isascii():
+            return cv2.imread(absolute_path, flags)
+
+        # cv2.imread не открывает пути с нелатинскими символами
         with open(absolute_path, 'rb') as f:
             file_bytes = np.asarray(bytearray(f.read()), dtype=np.uint8)
-        image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-
-        if verbose and not tqdm:
-            if not hasattr(load_image, "history"):
-                load_image.history = []
-            load_image.history.append(os.path.basename(image_path)[:15])
-            load_image.history = load_image.history[-10:]
-
-            progress = f"Последние файлы: {', '.join(load_image.history)}"
-            sys.stdout.write(f"\r{progress.ljust(120)}")
-            sys.stdout.flush()
-
-        return image
+        return cv2.imdecode(file_bytes, flags)
     except Exception as e:
         print(f"\nОшибка загрузки {os.path.basename(image_path)}: {e}")
         return None
 
 
-def preprocess_image(image, size=(300, 300)):
-    """Обработка изображения"""
-    image = cv2.resize(image, size)
-    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def preprocess_image(image, size=IMAGE_SIZE):
+    """Приведение изображения в оттенках серого к сетке SSIM"""
+    if pillow_simd:
+        # BOX — усреднение по площади, как cv2.INTER_AREA
+        return np.asarray(Image.fromarray(image).resize(size, Image.BOX))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def gaussian_blur(image):
+    """Гауссово окно SSIM"""
+    return cv2.GaussianBlur(image, SSIM_WINDOW, SSIM_SIGMA)
+
+
+def centre_image(image):
+    """Изображение float32 за вычетом своего среднего, округлённого до целого"""
+    offset = np.round(image.mean(axis=(-2, -1), keepdims=True)).astype(np.float32)
+    return image.astype(np.float32) - offset, offset
+
+
+def image_stats(image):
+    """Статистики SSIM одного изображения: вычисляются один раз на изображение"""
+    # Дисперсия и ковариация не зависят от сдвига яркости: после центрирования
+    # E[x^2] и E[xy] малы, и их разность с mu^2 во float32 не теряет точность
+    # на ярких однородных участках
+    img, offset = centre_image(image)
+    mu_c = gaussian_blur(img)
+    sigma_sq = gaussian_blur(img * img) - mu_c * mu_c
+    return ImageStats(img, mu_c + offset, mu_c, sigma_sq)
+
+
+def gaussian_blur_batch(images):
+    """Гауссово окно SSIM для пакета изображений формы (K, H, W)"""
+    # Поплоскостной вызов быстрее многоканального: OpenCV векторизует строки
+    blurred = np.empty_like(images)
+    for src, dst in zip(images, blurred):
+        cv2.GaussianBlur(src, SSIM_WINDOW, SSIM_SIGMA, dst=dst)
+    return blurred
+
+
+if njit:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _ssim_means_kernel(mu1, mu1_c, sigma1_sq, mu2, mu2_c, sigma2_sq, cross):
+        """Средний SSIM пакета за один проход без промежуточных массивов"""
+        k, h, w = cross.shape
+        row_sums = np.empty(k * h)
+        for r in prange(k * h):
+            b = r // h
+            y = r % h
+            acc = 0.0
+            for x in range(w):
+                m1 = mu1[y, x]
+                m2 = mu2[b, y, x]
+                sigma12 = cross[b, y, x] - mu1_c[y, x] * mu2_c[b, y, x]
+                num = (2 * m1 * m2 + SSIM_C1) * (2 * sigma12 + SSIM_C2)
+                den = ((m1 * m1 + m2 * m2 + SSIM_C1)
+                       * (sigma1_sq[y, x] + sigma2_sq[b, y, x] + SSIM_C2))
+                acc += num / den
+            row_sums[r] = acc
+        return row_sums.reshape(k, h).sum(axis=1) / (h * w)
+else:
+    _ssim_means_kernel = None
+
+
+def ssim_means(s1, s2, cross):
+    """Средний SSIM по статистикам и размытому взаимному члену центрированных E[xy]"""
+    if _ssim_means_kernel is not None:
+        return _ssim_means_kernel(s1.mu, s1.mu_c, s1.sigma_sq,
+                                  s2.mu, s2.mu_c, s2.sigma_sq, cross)
+
+    sigma12 = cross - s1.mu_c * s2.mu_c
+    num = (2 * s1.mu * s2.mu + SSIM_C1) * (2 * sigma12 + SSIM_C2)
+    den = (s1.mu * s1.mu + s2.mu * s2.mu + SSIM_C1) * (s1.sigma_sq + s2.sigma_sq + SSIM_C2)
+    return (num / den).mean(axis=(1, 2))
+
+
+def luminance_means(s1, s2):
+    """Средняя яркостная компонента SSIM — верхняя граница SSIM пары"""
+    mu12 = s1.mu * s2.mu
+    return ((2 * mu12 + SSIM_C1)
+            / (s1.mu * s1.mu + s2.mu * s2.mu + SSIM_C1)).mean(axis=(1, 2))
+
+
+def compare_row(s1, s2, min_similarity=None):
+    """SSIM одного изображения с пакетом: поля s2 имеют форму (K, H, W).
+
+    При заданном min_similarity для пар, у которых яркостная компонента уже
+    ниже порога, возвращается она сама — без размытия взаимного члена.
+    """
+    if min_similarity is not None:
+        bounds = luminance_means(s1, s2) * 100
+        passed = np.flatnonzero(bounds >= min_similarity)
+        if len(passed) < len(bounds):
+            if len(passed):
+                bounds[passed] = compare_row(s1, ImageStats(*(f[passed] for f in s2)))
+            return bounds
+
+    cross = gaussian_blur_batch(s1.img * s2.img)
+    # SSIM не больше 1; округления fastmath не должны давать 100.0x%
+    return np.minimum(ssim_means(s1, s2, cross) * 100, 100)
+
+
+def compare_pair(s1, s2):
+    """SSIM по готовым статистикам: на пару остаётся только взаимный член"""
+    return float(compare_row(s1, ImageStats(*(field[None] for field in s2)))[0])
+
+
+def phash(image):
+    """64-битный перцептивный хеш (pHash) изображения в оттенках серого"""
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(small.astype(np.float32))[:8, :8]
+    return np.packbits(dct > np.median(dct)).view(np.uint64)[0]
+
+
+def hamming_distances(hash_value, hashes):
+    """Расстояния Хэмминга от хеша до каждого хеша массива (XOR + popcount)"""
+    diff = np.bitwise_xor(hashes, hash_value)
+    return np.unpackbits(diff.view(np.uint8)).reshape(-1, 64).sum(axis=1)
 
 
 def compare_images(img1, img2):
     """Сравнение изображений"""
-    score, _ = ssim(img1, img2, full=True)
-    return score * 100
+    return compare_pair(image_stats(img1), image_stats(img2))
 
 
 def compare_two_images():
@@ -78,43 +307,39 @@ def compare_two_images():
     image1_path = input("Введите путь к первому изображению: ").strip()
     image2_path = input("Введите путь ко второму изображению: ").strip()
 
-    img1 = load_image(image1_path, verbose=False)
-    img2 = load_image(image2_path, verbose=False)
+    img1 = load_image(image1_path)
+    img2 = load_image(image2_path)
 
     img1_proc = preprocess_image(img1)
     img2_proc = preprocess_image(img2)
 
-    if img1_proc.shape != img2_proc.shape:
-        img2_proc = cv2.resize(img2_proc, (img1_proc.shape[1], img1_proc.shape[0]))
-
     similarity = compare_images(img1_proc, img2_proc)
     print(f"\nСхожесть: {similarity:.2f}%")
 
 def compare_image_with_folder(base_image_path, folder_path, min_similarity):
     """Сравнение с изображениями в папке"""
-    base_image = load_image(base_image_path, verbose=False)
+    base_image = load_image(base_image_path)
     base_image_proc = preprocess_image(base_image)
+    # Статистики базового изображения не зависят от пары — считаются один раз
+    base_stats = image_stats(base_image_proc)
 
     results = []
-    for filename in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, filename)
-        if os.path.abspath(file_path) == os.path.abspath(base_image_path):
-            continue
-
-        try:
-            compare_img = load_image(file_path, verbose=False)
-            compare_img_proc = preprocess_image(compare_img)
+    abs_base = os.path.abspath(base_image_path)
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if not entry.is_file() or os.path.abspath(entry.path) == abs_base:
+                continue
 
-            if base_image_proc.shape != compare_img_proc.shape:
-                compare_img_proc = cv2.resize(compare_img_proc, 
-                    (base_image_proc.shape[1], base_image_proc.shape[0]))
+            try:
+                compare_img = load_image(entry.path)
+                compare_img_proc = preprocess_image(compare_img)
 
-            similarity = compare_images(base_image_proc, compare_img_proc)
-            if similarity >= min_similarity:
-                results.append((filename, similarity))
-                print(f"{filename}: {similarity:.2f}%")
-        except:
-            continue
+                similarity = compare_pair(base_stats, image_stats(compare_img_proc))
+                if similarity >= min_similarity:
+                    results.append((entry.name, similarity))
+                    print(f"{entry.name}: {similarity:.2f}%")
+            except:
+                continue
 
     if results:
         results.sort(key=lambda x: x[1], reverse=True)
@@ -124,23 +349,272 @@ def compare_image_with_folder(base_image_path, folder_path, min_similarity):
     else:
         print("Совпадений не найдено.")
 
-def auto_scan_folder(folder_path, min_similarity):
-    """Авто-скан всех изображений в папке"""
+def _prepare_image(img_path, size_bytes=None, cached=None):
+    """Загрузка и подготовка одного изображения (выполняется в потоке).
+
+    cached — (изображение, pHash) из кэша: статистики SSIM пересчитываются
+    по нему двумя размытиями, без декодирования файла.
+    """
+    try:
+        if cached is None:
+            processed = preprocess_image(load_image(img_path, size_bytes))
+            hash_value = phash(processed)
+        else:
+            processed, hash_value = cached
+        stats = image_stats(processed)
+        return SharedStats(processed, stats.mu, stats.sigma_sq), hash_value, None
+    except Exception as e:
+        return None, None, e
+
+
+def _file_key(entry):
+    """Ключ актуальности файла для кэша: (mtime в нс, размер) из DirEntry"""
+    try:
+        st = entry.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _cache_backend():
+    """Декодер и ресемплер, от которых зависят пиксели в кэше"""
+    decoder = "turbojpeg" if turbo_jpeg else "opencv"
+    resizer = "pillow-simd" if pillow_simd else "opencv"
+    return f"{decoder}/{resizer}/opencv-{cv2.__version__}"
+
+
+def _cache_path(folder_path):
+    """Путь к файлу кэша статистик папки"""
+    digest = hashlib.sha1(os.path.abspath(folder_path).encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{digest[:16]}.npz")
+
+
+def load_stats_cache(folder_path):
+    """Загружает кэш папки: {имя файла: (ключ файла, изображение uint8, pHash)}"""
+    cache_path = _cache_path(folder_path)
+    try:
+        with np.load(cache_path) as data:
+            if (int(data["version"]) != CACHE_VERSION
+                    or tuple(data["image_size"]) != IMAGE_SIZE
+                    or str(data["backend"]) != _cache_backend()):
+                return {}
+            names = data["names"].tolist()
+            mtimes = data["mtimes"].tolist()
+            sizes = data["sizes"].tolist()
+            images = data["images"]
+            hashes = data["phashes"]
+        # Время изменения файла кэша — время его последнего использования
+        os.utime(cache_path)
+    except Exception:
+        # Повреждённый или недописанный кэш считается промахом
+        return {}
+
+    return {
+        name: ((mtime, size), images[k], hashes[k])
+        for k, (name, mtime, size) in enumerate(zip(names, mtimes, sizes))
+    }
+
+
+def prune_stats_cache(max_age=CACHE_MAX_AGE):
+    """Удаляет файлы кэша, не использовавшиеся дольше max_age секунд"""
+    cutoff = time.time() - max_age
+    try:
+        with os.scandir(CACHE_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith((".npz", ".tmp")) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+    except OSError:
+        pass
+
+
+def save_stats_cache(folder_path, names, keys, images, hashes):
+    """Сохраняет подготовленные изображения (N, H, W) uint8 и pHash папки.
+
+    Статистики SSIM не сохраняются: они дёшево пересчитываются по изображению.
+    Файлы без ключа актуальности (stat не удался) в кэш не попадают.
+    """
+    keep = [k for k, key in enumerate(keys) if key is not None]
+    cache_path = _cache_path(folder_path)
+    tmp_path = cache_path + ".tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=CACHE_VERSION,
+                image_size=np.array(IMAGE_SIZE),
+                backend=_cache_backend(),
+                names=np.array([names[k] for k in keep], dtype=str),
+                mtimes=np.array([keys[k][0] for k in keep], dtype=np.int64),
+                sizes=np.array([keys[k][1] for k in keep], dtype=np.int64),
+                images=images[keep],
+                phashes=hashes[keep],
+            )
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"\nНе удалось сохранить кэш: {e}")
+    prune_stats_cache()
+
+
+def _shared_stats(buffer, capacity):
+    """Раскладка общей памяти: по непрерывному тензору (N, H, W) на поле SharedStats"""
+    shape = (capacity,) + IMAGE_SIZE[::-1]
+    fields = []
+    offset = 0
+    for dtype in SHARED_DTYPES:
+        fields.append(np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset))
+        offset += fields[-1].nbytes
+    return SharedStats(*fields)
+
+
+def _shared_image_stats(shared, index):
+    """ImageStats во float32 из общей памяти для индекса или среза изображений"""
+    img, offset = centre_image(shared.img[index])
+    mu = shared.mu[index]
+    return ImageStats(img, mu, mu - offset, shared.sigma_sq[index])
+
+
+def _init_scan_worker(shm_name, capacity, prefilter, min_similarity):
+    """Инициализация процесса сравнения: подключение к общей памяти"""
+    cv2.setNumThreads(1)
+    if njit:
+        set_num_threads(1)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _scan_state["shm"] = shm
+    _scan_state["stats"] = _shared_stats(shm.buf, capacity)
+    _scan_state["prefilter"] = prefilter
+    _scan_state["min_similarity"] = min_similarity
+
+
+def _row_candidates(prefilter, i):
+    """Префильтр по pHash: индексы j > i, для которых считается SSIM"""
+    n = len(prefilter.hashes)
+    if prefilter.max_distance is None or not prefilter.textured[i]:
+        return np.arange(i + 1, n)
+    distances = hamming_distances(prefilter.hashes[i], prefilter.hashes[i + 1:])
+    close = (distances <= prefilter.max_distance) | ~prefilter.textured[i + 1:]
+    return i + 1 + np.flatnonzero(close)
+
+
+def _scan_row(i):
+    """Сравнение изображения i со всеми последующими (выполняется в процессе).
+
+    Возвращает совпадения строки и число пар, отсеянных префильтром pHash.
+    """
+    stats = _scan_state["stats"]
+    prefilter = _scan_state["prefilter"]
+    min_similarity = _scan_state["min_similarity"]
+    stats1 = _shared_image_stats(stats, i)
+    candidates = _row_candidates(prefilter, i)
+    skipped = len(prefilter.hashes) - 1 - i - len(candidates)
+
+    row = []
+    if len(candidates) == 0:
+        return row, skipped
+
+    # Непрерывные отрезки кандидатов берутся срезами SoA-тензоров, без копирования
+    runs = np.split(candidates, np.flatnonzero(np.diff(candidates) != 1) + 1)
+    for run in runs:
+        end = int(run[-1]) + 1
+        for start in range(int(run[0]), end, ROW_BATCH):
+            stop = min(start + ROW_BATCH, end)
+            similarities = compare_row(
+                stats1, _shared_image_stats(stats, slice(start, stop)), min_similarity)
+            matched = np.flatnonzero(similarities >= min_similarity)
+            row.extend((i, start + int(k), float(similarities[k])) for k in matched)
+    return row, skipped
+
+
+def load_gpu_backend():
+    """Лениво подключает JAX/dm_pix; возвращает GpuBackend или None без GPU"""
+    global _gpu_backend
+    if _gpu_backend is None:
+        _gpu_backend = False
+        try:
+            import jax
+            import jax.numpy as jnp
+            from dm_pix import ssim as pix_ssim
+
+            if jax.default_backend() != "cpu":
+                kernel = cv2.getGaussianKernel(SSIM_WINDOW[0], SSIM_SIGMA).ravel()
+                radius = len(kernel) // 2
+
+                def gaussian_blur_reflect(z):
+                    """Гауссово окно SSIM для (B, H, W, 1) с границами как у cv2.GaussianBlur"""
+                    # dm_pix по умолчанию сворачивает в режиме 'valid' и теряет
+                    # края; mode="reflect" в jnp.pad — это BORDER_REFLECT_101 OpenCV
+                    h, w = z.shape[1], z.shape[2]
+                    z = jnp.pad(z, ((0, 0), (radius, radius), (radius, radius), (0, 0)),
+                                mode="reflect")
+                    z = sum(float(c) * z[:, t:t + h] for t, c in enumerate(kernel))
+                    return sum(float(c) * z[:, :, t:t + w] for t, c in enumerate(kernel))
+
+                @jax.jit
+                def ssim_batch(imgs, pairs_i, pairs_j):
+                    """SSIM пар (pairs_i[k], pairs_j[k]) (dm_pix, XLA)"""
+                    a = imgs[pairs_i].astype(jnp.float32)[..., None]
+                    b = imgs[pairs_j].astype(jnp.float32)[..., None]
+                    return pix_ssim(a, b, max_val=255.0, filter_fn=gaussian_blur_reflect) * 100
+
+                _gpu_backend = GpuBackend(jnp, ssim_batch)
+        except (ImportError, RuntimeError):
+            pass
+    return _gpu_backend or None
+
+
+def _scan_rows_gpu(backend, imgs, prefilter, min_similarity):
+    """Сравнение всех строк на GPU.
+
+    Выдаёт (i, совпадения строки, отсеяно pHash) по мере готовности строк.
+    """
+    n = len(prefilter.hashes)
+    rows = [_row_candidates(prefilter, i) for i in range(n - 1)]
+    row_ends = np.cumsum([len(row) for row in rows])
+    pairs_i = np.repeat(np.arange(n - 1, dtype=np.int32), [len(row) for row in rows])
+    pairs_j = np.concatenate(rows).astype(np.int32)
+    similarities = np.empty(len(pairs_j), dtype=np.float32)
+
+    # Все кандидаты идут одним плоским списком пакетами фиксированного
+    # размера: ядро компилируется один раз, дополняется только последний пакет
+    batch_i = np.zeros(GPU_BATCH, dtype=np.int32)
+    batch_j = np.zeros(GPU_BATCH, dtype=np.int32)
+    next_row = 0
+    for start in range(0, len(pairs_j) + 1, GPU_BATCH):
+        stop = min(start + GPU_BATCH, len(pairs_j))
+        if stop > start:
+            batch_i[:stop - start] = pairs_i[start:stop]
+            batch_j[:stop - start] = pairs_j[start:stop]
+            batch = backend.ssim_batch(imgs, batch_i, batch_j)
+            similarities[start:stop] = np.asarray(batch)[:stop - start]
+
+        while next_row < n - 1 and row_ends[next_row] <= stop:
+            begin = row_ends[next_row] - len(rows[next_row])
+            matched = begin + np.flatnonzero(
+                similarities[begin:row_ends[next_row]] >= min_similarity)
+            yield (next_row,
+                   [(next_row, int(pairs_j[k]), float(similarities[k])) for k in matched],
+                   n - 1 - next_row - len(rows[next_row]))
+            next_row += 1
+
+
+def auto_scan_folder(folder_path, min_similarity, use_gpu=False):
+    """Авто-скан всех изображений в папке (use_gpu — сравнение пар через JAX)"""
     try:
         if not os.path.isdir(folder_path):
             print(f"Ошибка: {folder_path} не существует")
             return []
 
-        image_files = [
-            os.path.join(folder_path, f) for f in os.listdir(folder_path) 
-            if f.lower().endswith(('.png','.jpg','.jpeg','.bmp','.tiff'))
-        ]
+        with os.scandir(folder_path) as entries:
+            image_entries = [
+                e for e in entries
+                if e.is_file() and e.name.lower().endswith(('.png','.jpg','.jpeg','.bmp','.tiff'))
+            ]
+        image_files = [e.path for e in image_entries]
 
         if len(image_files) < 2:
             print("Нужно минимум 2 изображения")
             return []
 
-        total_pairs = comb(len(image_files), 2)
         results = []
         start_time = time.time()
 
@@ -150,76 +624,130 @@ def auto_scan_folder(folder_path, min_similarity):
         else:
             print("Загрузка изображений...")
 
-        # Предзагрузка изображений
-        processed_images = {}
-        for img_path in image_files:
-            try:
-                img = load_image(img_path, verbose=not tqdm)
-                processed = preprocess_image(img)
-                processed_images[img_path] = processed
-                if tqdm:
-                    load_pbar.update(1)
-                    load_pbar.set_postfix(file=os.path.basename(img_path)[:20])
-            except Exception as e:
-                print(f"\nОшибка: {os.path.basename(img_path)} - {str(e)}")
-                continue
-
-        if tqdm:
-            load_pbar.close()
-
-        # Основное сравнение
-        if tqdm:
-            pbar = tqdm(total=total_pairs, desc="🔍 Сравнение", unit="pair", 
-                        bar_format="{l_bar}{bar:40}{r_bar}{bar:-40b}")
-        else:
-            print("\nНачато сравнение...")
-            set_window_title("Авто-скан 0.0%")
-
-        current_pair = 0
-        for i in range(len(image_files)):
-            img1_path = image_files[i]
-            if img1_path not in processed_images:
-                continue
-
-            img1 = processed_images[img1_path]
-
-            for j in range(i+1, len(image_files)):
-                img2_path = image_files[j]
-                if img2_path not in processed_images:
-                    continue
-
-                img2 = processed_images[img2_path]
-
-                try:
-                    if img1.shape != img2.shape:
-                        img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
-
-                    similarity = compare_images(img1, img2)
-                    if similarity >= min_similarity:
-                        results.append((
-                            os.path.basename(img1_path),
-                            os.path.basename(img2_path),
-                            similarity
-                        ))
-                except Exception as e:
-                    print(f"\nОшибка сравнения: {e}")
-                    similarity = 0
-
-                # Обновление прогресса
-                current_pair += 1
+        # Статистики всех изображений в общей памяти процессов в виде SoA:
+        # каждое поле SharedStats — непрерывный тензор (N, H, W)
+        capacity = len(image_files)
+        plane = capacity * IMAGE_SIZE[0] * IMAGE_SIZE[1]
+        size = sum(plane * np.dtype(dtype).itemsize for dtype in SHARED_DTYPES)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        shared = None
+        try:
+            shared = _shared_stats(shm.buf, capacity)
+            hashes = np.empty(len(image_files), dtype=np.uint64)
+            textured = np.empty(len(image_files), dtype=bool)
+            image_names = [e.name for e in image_entries]
+            file_keys = [_file_key(e) for e in image_entries]
+            loaded_files = []
+            loaded_names = []
+            loaded_keys = []
+
+            # Предзагрузка изображений: неизменённые файлы берутся из кэша
+            cache = load_stats_cache(folder_path)
+            cached = [cache[name][1:] if key is not None and name in cache
+                      and cache[name][0] == key else None
+                      for name, key in zip(image_names, file_keys)]
+            workers = min(32, 4 * (os.cpu_count() or 1))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                prepared = executor.map(
+                    _prepare_image,
+                    image_files,
+                    [key[1] if key else None for key in file_keys],
+                    cached)
+                for loaded, (img_path, name, key, (stats, hash_value, error)) in enumerate(
+                        zip(image_files, image_names, file_keys, prepared), 1):
+                    if error is not None:
+                        print(f"\nОшибка: {os.path.basename(img_path)} - {str(error)}")
+                    else:
+                        k = len(loaded_files)
+                        for field, value in zip(shared, stats):
+                            field[k] = value
+                        hashes[k] = hash_value
+                        textured[k] = stats.img.std() >= PHASH_MIN_CONTRAST
+                        loaded_files.append(img_path)
+                        loaded_names.append(name)
+                        loaded_keys.append(key)
+                    if tqdm:
+                        load_pbar.update(1)
+                        load_pbar.set_postfix(file=os.path.basename(img_path)[:20])
+                    else:
+                        print_progress(loaded, len(image_files), "Загрузка")
+
+            if tqdm:
+                load_pbar.close()
+
+            n = len(loaded_files)
+            if any(c is None for c in cached) or len(cache) != n:
+                save_stats_cache(folder_path, loaded_names, loaded_keys,
+                                 shared.img[:n], hashes[:n])
+            del cache, cached
+
+            if n < 2:
+                print("\nНужно минимум 2 изображения")
+                return []
+            total_pairs = comb(n, 2)
+            prefilter = PhashFilter(
+                hashes[:n], textured[:n],
+                PHASH_MAX_DISTANCE if min_similarity >= PHASH_MIN_SIMILARITY else None)
+
+            # Основное сравнение
+            if tqdm:
+                pbar = tqdm(total=total_pairs, desc="🔍 Сравнение", unit="pair", 
+                            bar_format="{l_bar}{bar:40}{r_bar}{bar:-40b}")
+            else:
+                print("\nНачато сравнение...")
+                set_window_title("Авто-скан 0.0%")
+
+            current_pair = 0
+            skipped_pairs = 0
+
+            def record_row(i, row, skipped):
+                """Учёт результатов строки i и обновление прогресса"""
+                nonlocal current_pair, skipped_pairs
+                skipped_pairs += skipped
+                for _, j, similarity in row:
+                    results.append((loaded_names[i], loaded_names[j], similarity))
+
+                current_pair += n - 1 - i
+                progress = current_pair / total_pairs * 100
+                set_window_title(f"Авто-скан {progress:.1f}%")
                 if tqdm:
-                    pbar.update(1)
-                    pbar.set_postfix_str(
-                        f"{os.path.basename(img1_path)[:15]} ↔ "
-                        f"{os.path.basename(img2_path)[:15]} "
-                        f"({similarity:.1f}%)"
-                    )
-                    progress = current_pair / total_pairs * 100
-                    set_window_title(f"Авто-скан {progress:.1f}%")
+                    pbar.update(n - 1 - i)
+                    pbar.set_postfix_str(loaded_names[i][:15])
                 else:
-                    set_window_title(f"Авто-скан {progress:.1f}%")
-                    if current_pair % 10 == 0:
-                        print_progress(current_pair, total_pairs)
+                    print_progress(current_pair, total_pairs)
+
+            gpu_backend = load_gpu_backend() if use_gpu else None
+            if use_gpu and not gpu_backend:
+                print("\nGPU недоступен (нужны JAX с поддержкой GPU и dm-pix), сравнение на CPU")
+            if gpu_backend:
+                imgs = gpu_backend.jnp.asarray(shared.img[:n])
+                for i, row, skipped in _scan_rows_gpu(gpu_backend, imgs, prefilter,
+                                                      min_similarity):
+                    record_row(i, row, skipped)
+            else:
+                workers = min(os.cpu_count() or 1, n - 1)
+                # spawn, как в Windows: fork после запуска потоков OpenCV/Numba небезопасен
+                with ProcessPoolExecutor(max_workers=workers,
+                                         mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_scan_worker,
+                                         initargs=(shm.name, capacity, prefilter,
+                                                   min_similarity)) as executor:
+                    futures = {executor.submit(_scan_row, i): i for i in range(n - 1)}
+                    try:
+                        for future in as_completed(futures):
+                            try:
+                                row, skipped = future.result()
+                            except Exception as e:
+                                print(f"\nОшибка сравнения: {e}")
+                                row, skipped = [], 0
+                            record_row(futures[future], row, skipped)
+                    except KeyboardInterrupt:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        raise
+        finally:
+            del shared
+            shm.close()
+            shm.unlink()
 
         # Завершение
         if tqdm:
@@ -231,6 +759,8 @@ def auto_scan_folder(folder_path, min_similarity):
         # Вывод результатов
         print(f"\n{'='*50}")
         print(f"Найдено совпадений: {len(results)}")
+        if prefilter.max_distance is not None:
+            print(f"Пропущено по pHash без расчёта SSIM: {skipped_pairs} из {total_pairs} пар")
         print(f"Время выполнения: {timedelta(seconds=int(time.time()-start_time))}")
         print(f"{'='*50}")
 
@@ -244,7 +774,7 @@ def auto_scan_folder(folder_path, min_similarity):
         print("\n\nСканирование прервано!")
         return []
     finally:
-        set_window_title("Готово")
+        set_window_title("Готово", force=True)
         if not tqdm:
             sys.stdout.write("\r" + " " * 120 + "\r")  # Очистка строки
 
@@ -288,7 +818,7 @@ def main():
             folder = input("Путь к папке: ").strip()
             try:
                 min_sim = float(input("Минимальный процент схожести: "))
-                auto_scan_folder(folder, min_sim)
+                auto_scan_folder(folder, min_sim, use_gpu="--gpu" in sys.argv[1:])
             except:
                 print("Ошибка ввода!")
         else: